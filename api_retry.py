@@ -0,0 +1,103 @@
+"""
+Shared retry and throttling policy for OpenAI/Gemini API calls.
+
+Transient failures (rate limits, 5xx, dropped connections) are retried with
+exponential backoff plus jitter, and every attempt holds one of
+MAX_CONCURRENT (default 5) process-wide slots so batch callers throttle
+themselves instead of hammering the provider into 429s. Coroutine calls
+(AsyncOpenAI) get the same policy via with_async_backoff, throttled by an
+asyncio.Semaphore of the same size so waiting never blocks the event loop
+(one per running loop, since each asyncio.run() starts a fresh one).
+"""
+import os
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Any, Callable, TypeVar
+
+import click
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+MAX_ATTEMPTS = 5
+MAX_CONCURRENT = int(os.getenv("MAX_CONCURRENT", "5"))
+_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT)
+_ASYNC_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def openai_transient(exc: BaseException) -> bool:
+    import openai
+    return isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def gemini_transient(exc: BaseException) -> bool:
+    import httpx
+    from google.genai import errors
+    if isinstance(exc, errors.ServerError) or isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, errors.ClientError) and exc.code == 429
+
+
+def _async_slots() -> asyncio.Semaphore:
+    # asyncio primitives bind to the first loop that waits on them
+    loop = asyncio.get_running_loop()
+    slots = _ASYNC_SLOTS.get(loop)
+    if slots is None:
+        slots = _ASYNC_SLOTS[loop] = asyncio.Semaphore(MAX_CONCURRENT)
+    return slots
+
+
+def _log_backoff(state: RetryCallState) -> None:
+    exc = state.outcome.exception()
+    click.echo(
+        click.style(
+            f"⏳ {type(exc).__name__}: {exc} — retrying in {state.next_action.sleep:.1f}s "
+            f"(attempt {state.attempt_number + 1}/{MAX_ATTEMPTS})",
+            fg="yellow",
+        ),
+        err=True,
+    )
+
+
+def _retrying(retry_if: Callable[[BaseException], bool]):
+    return retry(
+        retry=retry_if_exception(retry_if),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        before_sleep=_log_backoff,
+        reraise=True,
+    )
+
+
+def with_backoff(retry_if: Callable[[BaseException], bool]) -> Callable[[F], F]:
+    """Decorate an API call with throttling and exponential-jitter retries."""
+    def decorate(fn: F) -> F:
+        @_retrying(retry_if)
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _SLOTS:
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def with_async_backoff(retry_if: Callable[[BaseException], bool]) -> Callable[[F], F]:
+    """Coroutine version of with_backoff; backoff sleeps with asyncio.sleep."""
+    def decorate(fn: F) -> F:
+        @_retrying(retry_if)
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async with _async_slots():
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def call_with_backoff(retry_if: Callable[[BaseException], bool], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    return with_backoff(retry_if)(fn)(*args, **kwargs)
+
+
+async def acall_with_backoff(retry_if: Callable[[BaseException], bool], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    return await with_async_backoff(retry_if)(fn)(*args, **kwargs)
@@ -1,11 +1,20 @@
 import os
 import time
+import atexit
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from pathlib import Path
 from PIL import Image
 import click
 from google import genai
 import time
 
+import assets
+import cache
+from api_retry import call_with_backoff, gemini_transient
+
 SYSTEM_MESSAGE = (
     "Create a 970:600 px full module (strictly follow this size for the generated module, "
     "don’t generate other sizes) for the product following the instructions below.\n"
@@ -16,59 +25,97 @@ SYSTEM_MESSAGE = (
 FINAL_WIDTH = 970
 FINAL_HEIGHT = 600
 
+MODEL = "gemini-2.5-flash-image"
+
+# Built once at import; only the instructions vary per call
+PROMPT_TEMPLATE = SYSTEM_MESSAGE + """
+
+Instructions:
+{instructions}
+
+Placement guidelines:
+- Include both the provided PRODUCT and LOGO in the final image.
+- Keep the LOGO pristine (no visual alterations); place it cleanly (e.g., top-right).
+- Display the PRODUCT prominently (left or center-left) with space for text on the right.
+- Maintain a cohesive, premium, Montessori-inspired tone and color harmony.
+"""
+
 def read_instruction_file(path: str) -> str:
     """Read generation instruction from a local text file."""
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"❌ Instruction file not found: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
+    try:
+        content = Path(path).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"❌ Instruction file not found: {path}") from None
     if not content:
         raise ValueError("❌ Instruction file is empty.")
     return content
 
 
-def save_inline_image(part, outdir, stem="gemini_result"):
-    """Save inline image returned from Gemini."""
-    os.makedirs(outdir, exist_ok=True)
+def save_inline_image(part, outdir, stem="gemini_result", resample=Image.Resampling.LANCZOS, output_format="png"):
+    """Save inline image returned from Gemini into an existing outdir."""
     data = part.inline_data.data
     img = Image.open(BytesIO(data))
-    resized = img.resize((FINAL_WIDTH, FINAL_HEIGHT), Image.LANCZOS)
+    # The request's 4:3 ImageConfig means Gemini never returns 970x600 (97:60) or a
+    # multiple of it, so the resample can't be skipped
+    resized = img.resize((FINAL_WIDTH, FINAL_HEIGHT), resample)
 
     ts = int(time.time())
-    path = os.path.join(outdir, f"{stem}_{ts}.png")
-    resized.save(path)
+    path = os.path.join(outdir, f"{stem}_{ts}.{output_format}")
+    assets.save_final_image(resized, path, output_format)
     return path
 
-SUPPORTED_SIZES = {"1024x1024", "1024x1536", "1536x1024", "auto"}
+def load_image(path: str) -> Image.Image:
+    """Open and fully decode an image so the work happens on the calling thread."""
+    img = Image.open(path)
+    img.load()
+    return img
 
-def generate_image(product_path: str, logo_path: str, instruction_path: str, outdir:str, size: str):
-    """Generate a composite image using Gemini."""
-    if not os.path.exists(product_path):
-        raise FileNotFoundError(f"❌ Missing product image: {product_path}")
-    if not os.path.exists(logo_path):
-        raise FileNotFoundError(f"❌ Missing logo image: {logo_path}")
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
 
-    instruction_text = read_instruction_file(instruction_path)
-    client = genai.Client()
+def get_client() -> genai.Client:
+    """Return the process-wide Gemini client so keep-alive connections are reused."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = genai.Client()
+            atexit.register(_CLIENT.close)
+    return _CLIENT
 
-    prompt = f"""{SYSTEM_MESSAGE}
+SUPPORTED_SIZES = {"1024x1024", "1024x1536", "1536x1024", "auto"}
 
-Instructions:
-{instruction_text}
+def generate_image(product_path: str, logo_path: str, instruction_path: str, outdir:str, size: str, use_cache: bool = True, fast_resize: bool = False, output_format: str = "png"):
+    """Generate a composite image using Gemini and return the saved image paths.
 
-Placement guidelines:
-- Include both the provided PRODUCT and LOGO in the final image.
-- Keep the LOGO pristine (no visual alterations); place it cleanly (e.g., top-right).
-- Display the PRODUCT prominently (left or center-left) with space for text on the right.
-- Maintain a cohesive, premium, Montessori-inspired tone and color harmony.
-"""
-    # Load images
-    product_img = Image.open(product_path)
-    logo_img = Image.open(logo_path)
+    Paths are not pre-checked: the CLI options already validate them, and the
+    reads below raise FileNotFoundError for programmatic callers.
+    """
+    instruction_text = read_instruction_file(instruction_path)
+
+    prompt = PROMPT_TEMPLATE.format(instructions=instruction_text)
+    resample = assets.resample_filter(fast_resize)
+    if use_cache:
+        key = cache.cache_key(prompt, cache.file_digest(product_path), cache.file_digest(logo_path), MODEL, size, resample.name, output_format)
+        cached_paths = cache.restore(key, outdir)
+        if cached_paths:
+            click.echo(click.style("♻️ Reused cached image(s) for identical inputs:", fg="green"))
+            for p in cached_paths:
+                click.echo(f"- {p}")
+            return cached_paths
+
+    # Decode both images off the main thread while the client is set up
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        product_future = pool.submit(load_image, product_path)
+        logo_future = pool.submit(load_image, logo_path)
+        client = get_client()
+        product_img = product_future.result()
+        logo_img = logo_future.result()
 
     # === Generate ===
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-image",
+    response = call_with_backoff(
+        gemini_transient,
+        client.models.generate_content,
+        model=MODEL,
         contents=[prompt, product_img, logo_img],
         config=genai.types.GenerateContentConfig(
             response_modalities=[
@@ -80,20 +127,29 @@ Placement guidelines:
         ),
     )
 
+    Path(outdir).mkdir(parents=True, exist_ok=True)
     image_paths = []
     for cand in response.candidates:
         for part in cand.content.parts:
             if getattr(part, "inline_data", None) and part.inline_data.mime_type.startswith("image/"):
-                image_paths.append(save_inline_image(part, outdir))
+                image_paths.append(save_inline_image(part, outdir, resample=resample, output_format=output_format))
             elif getattr(part, "text", None):
                 click.echo(click.style(f"Model note: {part.text}", fg="yellow"))
 
     if not image_paths:
         click.echo(click.style("⚠️ No images returned. Check safety filters or instruction content.", fg="red"))
     else:
+        if use_cache:
+            cache.store(key, image_paths)
         click.echo(click.style("✅ Generated image(s):", fg="green"))
         for p in image_paths:
             click.echo(f"- {p}")
+    return image_paths
+
+
+async def agenerate_image(product_path: str, logo_path: str, instruction_path: str, outdir: str, size: str, **kwargs):
+    """Async entry point; runs generate_image on a worker thread so other providers' calls can overlap."""
+    return await asyncio.to_thread(generate_image, product_path, logo_path, instruction_path, outdir, size, **kwargs)
 
 
 @click.command()
@@ -129,10 +185,41 @@ Placement guidelines:
     show_default=True,
     help="Generation size (Gemini supports 1024x1024, 1024x1536, 1536x1024, or auto).",
 )
-def main(product_image, logo_image, instruction_path, size, outdir):
+@click.option(
+    "--no-cache",
+    "no_cache",
+    is_flag=True,
+    default=False,
+    help="Always call Gemini, even if identical inputs were generated before.",
+)
+@click.option(
+    "--fast-resize",
+    "fast_resize",
+    is_flag=True,
+    default=False,
+    help=assets.FAST_RESIZE_HELP,
+)
+@click.option(
+    "--output-format",
+    "output_format",
+    type=click.Choice(["png", "jpg"]),
+    default="png",
+    show_default=True,
+    help="File format of the final 970x600 image.",
+)
+def main(product_image, logo_image, instruction_path, size, outdir, no_cache, fast_resize, output_format):
     """Generate a 970x600 Amazon A+ module image using Gemini."""
     start = time.time()
-    generate_image(product_image, logo_image, instruction_path, outdir, size)
+    generate_image(
+        product_image,
+        logo_image,
+        instruction_path,
+        outdir,
+        size,
+        use_cache=not no_cache,
+        fast_resize=fast_resize,
+        output_format=output_format,
+    )
     end = time.time()
     print(f"\nRuntime: {end - start:.4f} seconds\n")
 
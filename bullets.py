@@ -15,27 +15,30 @@ Example bullets.json:
 }
 """
 import os
+import re
 import json
-import base64
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 import click
 from openai import OpenAI
 
+import assets
+import clients
+import llm_json
+from api_retry import openai_transient, with_backoff
 
-def _encode_to_data_uri(image_path: Path) -> str:
-    ext = image_path.suffix.lower().replace(".", "")
-    if ext in {"jpg", "jpeg"}:
-        mime = "image/jpeg"
-    elif ext in {"png"}:
-        mime = "image/png"
-    elif ext in {"webp"}:
-        mime = "image/webp"
-    else:
-        mime = "application/octet-stream"
-    b64 = base64.b64encode(image_path.read_bytes()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+
+def _resolve_image_uris(*sources: Tuple[Optional[str], Optional[Path]]) -> List[Optional[str]]:
+    """Prefer hosted URLs (no base64 payload); encode local files concurrently."""
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        pending = [
+            url or (pool.submit(assets.image_data_uri, path) if path else None)
+            for url, path in sources
+        ]
+        return [p.result() if isinstance(p, Future) else p for p in pending]
 
 
 def _load_description(description: Optional[str], description_file: Optional[Path]) -> str:
@@ -82,45 +85,83 @@ OUTPUT FORMAT (JSON only):
 """
 
 
-def _extract_json(text: str) -> Dict[str, Any]:
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write via a sibling temp file and rename, so readers never see a partial file."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
     try:
-        return json.loads(text)
-    except Exception:
-        l = text.find("{")
-        r = text.rfind("}")
-        if l != -1 and r != -1 and r > l:
-            snippet = text[l:r+1]
-            return json.loads(snippet)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
         raise
 
 
-@click.command()
-@click.option("--product-image", "product_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=True, help="Path to the main product image.")
-@click.option("--logo-image", "logo_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to the brand logo image (optional but recommended).")
-@click.option("--title", required=True, help="Product title as shown on Amazon.")
-@click.option("--description", required=False, default=None, help="Short product description text. If not provided, use --description-file.")
-@click.option("--description-file", "description_file", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to a text file containing the product description.")
-@click.option("--prompt", "custom_prompt", required=False, default="Write 3 concise Amazon bullets: 1) Customer Benefit, 2) Key Feature, 3) Proof/Differentiator.", help="Custom instruction to steer style/brand tone.")
-@click.option("--model", required=False, default="gpt-4o-mini", show_default=True, help="OpenAI model with vision support.")
-@click.option("--outdir", type=click.Path(file_okay=False, path_type=Path), default=Path("."), show_default=True, help="Directory to write bullets.json and bullets.txt")
-def main(product_image: Path,
-         logo_image: Optional[Path],
-         title: str,
-         description: Optional[str],
-         description_file: Optional[Path],
-         custom_prompt: str,
-         model: str,
-         outdir: Path):
+_HEADING_RE = re.compile(r'"heading"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _decode_heading(escaped: str) -> str:
+    # The capture is still JSON-escaped (\", \u00e9, ...)
+    try:
+        return json.loads(f'"{escaped}"')
+    except ValueError:
+        return escaped
+
+
+def _stream_response_text(client: OpenAI, model: str, content_parts: List[Dict[str, Any]]) -> str:
+    """Stream the response, printing each bullet heading as soon as it is complete."""
+    printed = False
+
+    # A retry restarts the whole response, so say so before its headings repeat
+    @with_backoff(openai_transient)
+    def _attempt() -> str:
+        nonlocal printed
+        if printed:
+            print("Stream interrupted; restarting, the bullets below replace the ones above")
+            printed = False
+        text = ""
+        pos = 0
+        with client.responses.stream(
+            model=model,
+            input=[{"role": "user", "content": content_parts}],
+        ) as stream:
+            for event in stream:
+                if event.type != "response.output_text.delta":
+                    continue
+                text += event.delta
+                while (match := _HEADING_RE.search(text, pos)):
+                    pos = match.end()
+                    printed = True
+                    print(f"Received bullet: {_decode_heading(match.group(1))}")
+            return stream.get_final_response().output_text
+
+    return _attempt()
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_PROMPT = "Write 3 concise Amazon bullets: 1) Customer Benefit, 2) Key Feature, 3) Proof/Differentiator."
+
+
+def generate_bullets(title: str,
+                     outdir: Path,
+                     product_image: Optional[Path] = None,
+                     product_url: Optional[str] = None,
+                     logo_image: Optional[Path] = None,
+                     logo_url: Optional[str] = None,
+                     description: Optional[str] = None,
+                     description_file: Optional[Path] = None,
+                     custom_prompt: str = DEFAULT_PROMPT,
+                     model: str = DEFAULT_MODEL) -> List[str]:
+    """Generate the 3 bullets, write bullets.txt/bullets.json to outdir and return the flat bullets."""
     outdir.mkdir(parents=True, exist_ok=True)
 
-    product_uri = _encode_to_data_uri(product_image)
-    logo_uri = _encode_to_data_uri(logo_image) if logo_image else None
+    product_uri, logo_uri = _resolve_image_uris((product_url, product_image), (logo_url, logo_image))
     desc_text = _load_description(description, description_file)
 
     brand_prompt = f"Additional Prompt: {custom_prompt}\nDescription: {desc_text}"
     instruction = _build_instruction(title, brand_prompt)
 
-    client = OpenAI()
+    client = clients.get_client()
 
     content_parts = [
         {"type": "input_text", "text": instruction},
@@ -129,14 +170,9 @@ def main(product_image: Path,
     if logo_uri:
         content_parts.append({"type": "input_image", "image_url": logo_uri})
 
-    resp = client.responses.create(
-        model=model,
-        input=[{"role": "user", "content": content_parts}],
-    )
-
-    raw_text = resp.output_text
+    raw_text = _stream_response_text(client, model, content_parts)
     try:
-        data = _extract_json(raw_text)
+        data = llm_json.extract_json(raw_text)
     except Exception:
         data = {"bullets": []}
 
@@ -153,34 +189,73 @@ def main(product_image: Path,
         bullets.append(_blank_item())
     bullets = bullets[:3]
 
-    # Build TXT output (multi-line, same as before)
-    lines = []
+    # Build each bullet once; the TXT file, stdout and JSON all reuse these strings
+    txt_blocks = []
     flat_bullets = []  # for flat JSON format
     for idx, item in enumerate(bullets, start=1):
-        text_block = (
-            f"{item.get('heading','').strip()}\n\n"
+        heading = item.get('heading', '').strip()
+        details = (
             f"Customer Benefit: {item.get('customer_benefit','').strip()}\n"
             f"Key Feature: {item.get('key_feature','').strip()}\n"
             f"Proof / Differentiator: {item.get('proof_or_differentiator','').strip()}"
         )
-        flat_bullets.append(text_block)
-
+        flat_bullets.append(f"{heading}\n\n{details}")
         # For txt file with numbering
-        lines.append(f"{idx}. {item.get('heading','').strip()}")
-        lines.append(f"Customer Benefit: {item.get('customer_benefit','').strip()}")
-        lines.append(f"Key Feature: {item.get('key_feature','').strip()}")
-        lines.append(f"Proof / Differentiator: {item.get('proof_or_differentiator','').strip()}")
-        if idx < len(bullets):
-            lines.append("")
+        txt_blocks.append(f"{idx}. {heading}\n{details}")
+    txt_blob = "\n\n".join(txt_blocks)
 
     txt_path = outdir / "bullets.txt"
-    txt_path.write_text("\n".join(lines), encoding="utf-8")
+    _write_atomic(txt_path, txt_blob.encode("utf-8"))
 
     json_path = outdir / "bullets.json"
-    json_path.write_text(json.dumps({"bullets": flat_bullets}, ensure_ascii=False, indent=2), encoding="utf-8")
+    _write_atomic(json_path, json.dumps({"bullets": flat_bullets}, ensure_ascii=False, indent=2).encode("utf-8"))
 
-    print("\n".join(lines))
+    print(txt_blob)
     print(f"\nSaved:\n- {json_path}\n- {txt_path}")
+    return flat_bullets
+
+
+async def agenerate_bullets(title: str, outdir: Path, **kwargs) -> List[str]:
+    """Async entry point; runs generate_bullets on a worker thread so other providers' calls can overlap."""
+    return await asyncio.to_thread(generate_bullets, title, outdir, **kwargs)
+
+
+@click.command()
+@click.option("--product-image", "product_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to the main product image.")
+@click.option("--product-url", "product_url", required=False, help="Public URL of the product image; sent as-is instead of --product-image.")
+@click.option("--logo-image", "logo_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to the brand logo image (optional but recommended).")
+@click.option("--logo-url", "logo_url", required=False, help="Public URL of the brand logo; sent as-is instead of --logo-image.")
+@click.option("--title", required=True, help="Product title as shown on Amazon.")
+@click.option("--description", required=False, default=None, help="Short product description text. If not provided, use --description-file.")
+@click.option("--description-file", "description_file", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to a text file containing the product description.")
+@click.option("--prompt", "custom_prompt", required=False, default=DEFAULT_PROMPT, help="Custom instruction to steer style/brand tone.")
+@click.option("--model", required=False, default=DEFAULT_MODEL, show_default=True, help="OpenAI model with vision support.")
+@click.option("--outdir", type=click.Path(file_okay=False, path_type=Path), default=Path("."), show_default=True, help="Directory to write bullets.json and bullets.txt")
+def main(product_image: Optional[Path],
+         product_url: Optional[str],
+         logo_image: Optional[Path],
+         logo_url: Optional[str],
+         title: str,
+         description: Optional[str],
+         description_file: Optional[Path],
+         custom_prompt: str,
+         model: str,
+         outdir: Path):
+    if not product_image and not product_url:
+        raise click.UsageError("You must provide either --product-image or --product-url")
+
+    generate_bullets(
+        title,
+        outdir,
+        product_image=product_image,
+        product_url=product_url,
+        logo_image=logo_image,
+        logo_url=logo_url,
+        description=description,
+        description_file=description_file,
+        custom_prompt=custom_prompt,
+        model=model,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""
+On-disk cache for generated images and LLM responses.
+
+Image entries live under ~/.cache/saharan (override with SAHARAN_CACHE_DIR), one
+directory per key holding the files a run produced. Keys are blake2b hashes
+of everything that shapes the output (prompt text, input image bytes, model,
+size), so re-running with identical inputs skips the API call entirely.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Union
+
+CACHE_DIR = Path(os.getenv("SAHARAN_CACHE_DIR", Path.home() / ".cache" / "saharan"))
+_DIGESTS_PATH = CACHE_DIR / "digests.json"
+
+
+def _load_digests() -> dict:
+    try:
+        return json.loads(_DIGESTS_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Hash a file's bytes, reusing the previous hash while its mtime and size are unchanged."""
+    path = Path(path).resolve()
+    st = path.stat()
+    digests = _load_digests()
+    entry = digests.get(str(path))
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry["digest"]
+
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    digest = h.hexdigest()
+    digests[str(path)] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "digest": digest}
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Staged and renamed so concurrent CLIs never read a half-written manifest
+    tmp = _DIGESTS_PATH.with_name(f".{_DIGESTS_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(digests), encoding="utf-8")
+    os.replace(tmp, _DIGESTS_PATH)
+    return digest
+
+
+def cache_key(*parts: Union[str, bytes]) -> str:
+    """Build a stable key from text/bytes parts (length-prefixed so parts can't run together)."""
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def restore(key: str, outdir: Union[str, Path]) -> Optional[List[Path]]:
+    """Copy a cached entry into outdir and return the copied paths, or None on a miss."""
+    entry = CACHE_DIR / key
+    if not entry.is_dir():
+        return None
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    restored = []
+    for cached in sorted(entry.iterdir()):
+        restored.append(Path(shutil.copy2(cached, outdir / cached.name)))
+    return restored
+
+
+def store(key: str, paths: Iterable[Union[str, Path]]) -> None:
+    """Save the given output files under key; the entry appears atomically."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{key}_", dir=CACHE_DIR))
+    for path in paths:
+        shutil.copy2(path, staging / Path(path).name)
+    try:
+        os.replace(staging, CACHE_DIR / key)
+    except OSError:
+        # Another run stored the same key first; keep its entry
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# ========= LLM response cache =========
+# Small JSON entries (response text + token usage) with a time-to-live.
+
+LLM_TTL_SECONDS = 7 * 86400
+_LLM_DIR = CACHE_DIR / "llm"
+llm_stats = {"hits": 0, "misses": 0}
+
+
+def get_json(key: str) -> Optional[Any]:
+    """Return the cached value for key, or None if it is missing or expired."""
+    try:
+        entry = json.loads((_LLM_DIR / f"{key}.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        entry = None
+    if entry is None or entry["expires"] < time.time():
+        llm_stats["misses"] += 1
+        return None
+    llm_stats["hits"] += 1
+    return entry["value"]
+
+
+def set_json(key: str, value: Any, ttl: float = LLM_TTL_SECONDS) -> None:
+    """Store a JSON-serialisable value under key; the entry is replaced atomically."""
+    _LLM_DIR.mkdir(parents=True, exist_ok=True)
+    path = _LLM_DIR / f"{key}.json"
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"expires": time.time() + ttl, "value": value}, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
@@ -0,0 +1,60 @@
+"""
+Process-wide OpenAI clients shared by the CLIs.
+
+get_client() is the pooled sync client used by bullets.py and image.py:
+one client per api_key, so keep-alive connections are reused across calls
+and each client is closed at exit. get_async_client() is the AsyncOpenAI client shared by main.py and
+modules.py; it runs over a pooled HTTP/2 connection, so concurrent requests
+share a single TLS connection. httpx pools are bound to the event loop that
+used them, so each asyncio.run() should finish with close_async_client().
+
+Both clients leave retries to api_retry (backoff + concurrency cap) rather
+than the SDK, so retries are logged and throttled.
+"""
+import atexit
+import threading
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+_CLIENTS: Dict[Optional[str], OpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENT: Optional[AsyncOpenAI] = None
+
+
+def get_client(api_key: Optional[str] = None) -> OpenAI:
+    """Return the shared OpenAI client for api_key so keep-alive connections are reused."""
+    # Worker threads under run_all may ask for a client at the same time
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(api_key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                http_client=DefaultHttpxClient(
+                    limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=30),
+                ),
+            )
+            atexit.register(client.close)
+            _CLIENTS[api_key] = client
+    return client
+
+
+def get_async_client() -> AsyncOpenAI:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        http_client = DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=300.0,
+        )
+        _ASYNC_CLIENT = AsyncOpenAI(max_retries=0, http_client=http_client)
+    return _ASYNC_CLIENT
+
+
+async def close_async_client() -> None:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        client, _ASYNC_CLIENT = _ASYNC_CLIENT, None
+        await client.close()
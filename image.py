@@ -1,25 +1,47 @@
 import os
 import io
-import base64
+import asyncio
+import binascii
 import argparse
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Union
 
 from PIL import Image
-from openai import OpenAI
+
+import assets
+import cache
+import clients
+from api_retry import call_with_backoff, openai_transient
 
 # Target Amazon A+ spec
 TARGET_W, TARGET_H = 970, 600
 # Closest valid OpenAI generation size
 GEN_W, GEN_H = 1536, 1024
 
+MODEL = "gpt-image-1"
+
 SYSTEM_MESSAGE = (
     "Create a premium 970x600 Amazon A+ hero module that is typography-first. "
     "Use the provided text exactly, keep the layout modern, and emphasize clarity."
 )
 
-def save_b64_to_file(b64: str, path: str):
-    data = base64.b64decode(b64)
+# Built once at import; only the instructions vary per call
+PROMPT_TEMPLATE = SYSTEM_MESSAGE + """
+
+Text content to include:
+{instructions}
+
+Design requirements:
+- Focus on refined typography, subtle gradients, and premium color palettes.
+- Use text as the hero element; product photography is optional but exclude logos.
+- Keep ample white space and a clear hierarchy (headline, subhead, supporting copy).
+- Ensure the overall design feels modern, calm, and brand-agnostic.
+- Maintain the 970x600 aspect ratio (generated at 1536x1024 then downscaled)."""
+
+def write_bytes(path: str, data: bytes):
     with open(path, "wb") as f:
         f.write(data)
 
@@ -29,85 +51,141 @@ def image_to_bytes(img: Image.Image, format: str = "PNG") -> bytes:
     img.save(buf, format=format)
     return buf.getvalue()
 
-# python image.py --instruction_file=./example/instruction.txt
-def main():
-    parser = argparse.ArgumentParser(description="Generate 970x600 Amazon A+ module using OpenAI gpt-image-1.")
-    parser.add_argument("--instruction_file", required=True, help="Path to text file containing design instructions or copy.")
-    parser.add_argument("--api_key", default=os.getenv("OPENAI_API_KEY"), help="Your OpenAI API key.")
-    parser.add_argument(
-        "--result_dir",
-        default=None,
-        help="Directory where run artifacts (prompt, intermediate images) are stored. "
-        "Defaults to timestamped folder within ./results.",
-    )
-    args = parser.parse_args()
 
-    if not args.api_key:
-        raise SystemExit("❌ Missing OPENAI_API_KEY. Set it in your environment or pass --api_key.")
+def _make_run_folder(root: str) -> str:
+    """Create a unique timestamped folder under root with the usual umask permissions.
 
-    start = time.time()
-    client = OpenAI(api_key=args.api_key)
+    os.mkdir either claims the name or raises FileExistsError, so concurrent runs
+    never share a folder (mkdtemp would too, but always with mode 0700).
+    """
+    run_id = time.strftime("%Y%m%d_%H%M%S")
+    while True:
+        run_folder = os.path.join(root, run_id)
+        try:
+            os.mkdir(run_folder)
+            return run_folder
+        except FileExistsError:
+            run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
 
-    # 1️⃣ Read instruction file
-    with open(args.instruction_file, "r", encoding="utf-8") as f:
-        instruction_text = f.read().strip()
 
-    # 2️⃣ Build the prompt
-    prompt = f"""{SYSTEM_MESSAGE}
+def generate_module_image(instruction_file: Union[str, Path],
+                          api_key: Optional[str] = None,
+                          result_dir: Optional[str] = None,
+                          fast_resize: bool = False,
+                          output_format: str = "png",
+                          use_cache: bool = True) -> str:
+    """Generate the typography-first module image and return the final image path."""
+    client = clients.get_client(api_key)
 
-Text content to include:
-{instruction_text}
+    # 1️⃣ Read instruction file (a missing file surfaces as FileNotFoundError from the read itself)
+    instruction_text = Path(instruction_file).read_text(encoding="utf-8").strip()
 
-Design requirements:
-- Focus on refined typography, subtle gradients, and premium color palettes.
-- Use text as the hero element; product photography is optional but exclude logos.
-- Keep ample white space and a clear hierarchy (headline, subhead, supporting copy).
-- Ensure the overall design feels modern, calm, and brand-agnostic.
-- Maintain the 970x600 aspect ratio (generated at 1536x1024 then downscaled)."""
+    # 2️⃣ Build the prompt
+    prompt = PROMPT_TEMPLATE.format(instructions=instruction_text)
 
     # 3️⃣ Prepare result directory & save prompt
-    default_root = os.path.abspath("results")
-    os.makedirs(default_root, exist_ok=True)
-
-    run_id = time.strftime("%Y%m%d_%H%M%S")
-    if args.result_dir:
-        run_folder = os.path.abspath(args.result_dir)
+    if result_dir:
+        run_folder = os.path.abspath(result_dir)
         os.makedirs(run_folder, exist_ok=True)
     else:
-        run_folder = os.path.join(default_root, run_id)
-        while os.path.exists(run_folder):
-            run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
-            run_folder = os.path.join(default_root, run_id)
-        os.makedirs(run_folder, exist_ok=True)
+        default_root = os.path.abspath("results")
+        os.makedirs(default_root, exist_ok=True)
+        run_folder = _make_run_folder(default_root)
 
     prompt_path = os.path.join(run_folder, "prompt.txt")
     with open(prompt_path, "w", encoding="utf-8") as prompt_file:
         prompt_file.write(prompt)
 
+    raw_out_path = os.path.join(run_folder, "ai_output_1536x1024.png")
+    final_out = os.path.join(run_folder, f"final_output_970x600.{output_format}")
+    size = f"{GEN_W}x{GEN_H}"
+    resample = assets.resample_filter(fast_resize)
+    key = cache.cache_key(prompt, MODEL, size, resample.name, output_format)
+    if use_cache and cache.restore(key, run_folder):
+        print(f"♻️ Reused cached images for identical prompt in: {run_folder}")
+        print(f"🧠 Raw AI output (1536x1024): {raw_out_path}")
+        print(f"✅ Final image (970x600): {final_out}")
+        return final_out
+
     # 4️⃣ Generate text-focused image directly
     print("🎨 Generating base image (1536x1024)...")
-    result = client.images.generate(
-        model="gpt-image-1",
+    result = call_with_backoff(
+        openai_transient,
+        client.images.generate,
+        model=MODEL,
         prompt=prompt,
-        size=f"{GEN_W}x{GEN_H}",
+        size=size,
     )
 
-    # 5️⃣ Save raw output, then downscale to 970x600
-    b64 = result.data[0].b64_json
-    raw_out_path = os.path.join(run_folder, "ai_output_1536x1024.png")
-    save_b64_to_file(b64, raw_out_path)
+    # 5️⃣ Persist raw output in the background while downscaling to 970x600 in memory
+    raw_png = binascii.a2b_base64(result.data[0].b64_json)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        raw_written = pool.submit(write_bytes, raw_out_path, raw_png)
+
+        with Image.open(io.BytesIO(raw_png)) as img:
+            # Resample the decoded RGB/RGBA pixels directly; only odd modes (e.g. palette) need a convert
+            ai_image = img if img.mode in ("RGB", "RGBA") else img.convert("RGBA")
+            final_resized = ai_image.resize((TARGET_W, TARGET_H), resample)
+            assets.save_final_image(final_resized, final_out, output_format)
 
-    with Image.open(raw_out_path) as img:
-        ai_image = img.convert("RGBA")
-        final_resized = ai_image.resize((TARGET_W, TARGET_H), Image.LANCZOS)
-        final_out = os.path.join(run_folder, "final_output_970x600.png")
-        final_resized.save(final_out)
+        # Re-raises a failed raw write here, before anything is cached
+        raw_written.result()
+    if use_cache:
+        cache.store(key, [raw_out_path, final_out])
 
     print(f"🗂️ Result artifacts stored in: {run_folder}")
     print(f"📝 Prompt saved to: {prompt_path}")
     print(f"🧠 Raw AI output (1536x1024): {raw_out_path}")
     print(f"✅ Final image (970x600): {final_out}")
     print("📏 Generated at 1536x1024 and downscaled to exact target.")
+    return final_out
+
+
+async def agenerate_module_image(instruction_file: Union[str, Path], **kwargs) -> str:
+    """Async entry point; runs generate_module_image on a worker thread so other providers' calls can overlap."""
+    return await asyncio.to_thread(generate_module_image, instruction_file, **kwargs)
+
+# python image.py --instruction_file=./example/instruction.txt
+def main():
+    parser = argparse.ArgumentParser(description="Generate 970x600 Amazon A+ module using OpenAI gpt-image-1.")
+    parser.add_argument("--instruction_file", type=Path, required=True, help="Path to text file containing design instructions or copy.")
+    parser.add_argument("--api_key", default=os.getenv("OPENAI_API_KEY"), help="Your OpenAI API key.")
+    parser.add_argument(
+        "--result_dir",
+        default=None,
+        help="Directory where run artifacts (prompt, intermediate images) are stored. "
+        "Defaults to timestamped folder within ./results.",
+    )
+    parser.add_argument(
+        "--fast_resize",
+        action="store_true",
+        help=assets.FAST_RESIZE_HELP,
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=["png", "jpg"],
+        default="png",
+        help="File format of the final 970x600 image (default: png).",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Always call the API, even if this exact prompt was generated before.",
+    )
+    args = parser.parse_args()
+
+    if not args.api_key:
+        raise SystemExit("❌ Missing OPENAI_API_KEY. Set it in your environment or pass --api_key.")
+
+    start = time.time()
+    generate_module_image(
+        args.instruction_file,
+        api_key=args.api_key,
+        result_dir=args.result_dir,
+        fast_resize=args.fast_resize,
+        output_format=args.output_format,
+        use_cache=not args.no_cache,
+    )
     end = time.time()
     print(f"Runtime: {end - start:.4f} seconds")
 
@@ -0,0 +1,29 @@
+"""
+JSON recovery for LLM text output, shared by bullets.py and main.py.
+
+Models are asked for JSON only but sometimes wrap it in prose or code fences.
+extract_json() tries the whole text first, then falls back to the first
+complete object, skipping stray braces in any preamble.
+"""
+import json
+from typing import Any, Dict
+
+_DECODER = json.JSONDecoder()
+
+
+def extract_json(text: str) -> Dict[str, Any]:
+    """Return the JSON object in text; raises the original json error if none parses."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        # Parse from the first "{" and stop at its matching brace, so chatter (even
+        # chatter containing braces) after the object is ignored. If that brace is
+        # prose rather than JSON, move on to the next one.
+        start = text.find("{")
+        while start != -1:
+            try:
+                obj, _ = _DECODER.raw_decode(text, start)
+                return obj
+            except ValueError:
+                start = text.find("{", start + 1)
+        raise
@@ -1,29 +1,24 @@
 #!/usr/bin/env python3
 
-import json
 import io
-import os
-import base64
+import json
+import asyncio
+import functools
+import zlib
+import struct
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 from PIL import Image
 import time
 import click
-from openai import OpenAI
-
-def _encode_to_data_uri(image_path: Path) -> str:
-    ext = image_path.suffix.lower().replace(".", "")
-    if ext in {"jpg", "jpeg"}:
-        mime = "image/jpeg"
-    elif ext in {"png"}:
-        mime = "image/png"
-    elif ext in {"webp"}:
-        mime = "image/webp"
-    else:
-        mime = "application/octet-stream"
-    b64 = base64.b64encode(image_path.read_bytes()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+import pybase64
+from openai import AsyncOpenAI
 
+import assets
+import cache
+import clients
+import llm_json
+from api_retry import acall_with_backoff, openai_transient
 
 def _load_description(description: Optional[str], description_file: Optional[Path]) -> str:
     if description and description.strip():
@@ -33,8 +28,9 @@ def _load_description(description: Optional[str], description_file: Optional[Pat
     return ""
 
 
-def _build_bullet_llm_instruction(title: str) -> str:
-    return f"""\
+# Prompt text is fixed apart from the per-product inputs, so it is kept in module-level
+# constants and each builder only joins in the dynamic piece
+_BULLET_PREFIX = """\
 You are an Amazon E-commerce Content Manager.
 Task: Create **exactly 3** structured bullet items based on the product title, textual description, and the provided images (product + brand logo).
 
@@ -51,47 +47,40 @@ Style & Compliance:
 - If any claim is uncertain from inputs, use safe, generic phrasing (e.g., "durable wood construction").
 
 Inputs:
-- Title: {title}
+- Title: """
+
+_BULLET_SUFFIX = """
 
 OUTPUT FORMAT (JSON only):
-{{
+{
   "bullets": [
-    {{
+    {
       "heading": "<2–6 word hook>",
       "customer_benefit": "<150–220 chars>",
       "key_feature": "<150–220 chars>",
       "proof_or_differentiator": "<150–220 chars>"
-    }},
+    },
     ...
   ]
-}}
+}
 """
 
-def _get_llm_json_response(text: str) -> Dict[str, Any]:
-    try:
-        return json.loads(text)
-    except Exception:
-        l = text.find("{")
-        r = text.rfind("}")
-        if l != -1 and r != -1 and r > l:
-            snippet = text[l:r+1]
-            return json.loads(snippet)
-        raise
-
-def _get_bullet_llm_prompt(title: str, product_uri: str, logo_uri: str ) -> List[Dict[str, Any]]:
+def _build_bullet_llm_instruction(title: str) -> str:
+    return f"{_BULLET_PREFIX}{title}{_BULLET_SUFFIX}"
+
+def _get_bullet_llm_prompt(title: str, product_file_id: str, logo_file_id: Optional[str]) -> List[Dict[str, Any]]:
     bullet_instruction = _build_bullet_llm_instruction(title)
     content_parts = [
         {"type": "input_text", "text": bullet_instruction},
-        {"type": "input_image", "image_url": product_uri},
+        {"type": "input_image", "file_id": product_file_id},
     ]
 
-    if logo_uri:
-        content_parts.append({"type": "input_image", "image_url": logo_uri})
+    if logo_file_id:
+        content_parts.append({"type": "input_image", "file_id": logo_file_id})
 
     return [{"role": "user", "content": content_parts}]
 
-def _build_module_llm_instruction(title: str, bullets: str) -> str:
-    module_user_prompt = """
+_MODULE_USER_PROMPT = """
 Using the product’s image, logo, title, description, and bullet points,
 design five (5) optimized Amazon A+ Content modules (970 × 600 px each) that: 
 * Reflect a unified visual identity aligned with the brand’s tone and style. 
@@ -112,14 +101,8 @@ Module 1: Brand Story (Awareness) → Module 2: Craftsmanship (Education) → Mo
 Each module should serve a unique purpose while contributing to a cohesive and engaging overall narrative.
 """
 
-    inputs_block = (
-        f"\n\nInputs for context:\n"
-        f"Product Title:\n{title}\n\n"
-        f"Bullet Points:{bullets}\n"
-        f"\nAssets:\n- Product image (data URI provided)\n- Brand logo (data URI provided)\n"
-    )
-
-    outputs_block = """
+# Not an f-string: the doubled braces are sent to the model as-is
+_MODULE_OUTPUTS_BLOCK = """
 OUTPUT FORMAT (JSON only):
 {{
   "modules": [
@@ -134,10 +117,19 @@ OUTPUT FORMAT (JSON only):
   ]
 }}
 """
-    return module_user_prompt + inputs_block + outputs_block
 
-def _get_module_llm_prompt(title: str, bullets: str, product_uri: str, logo_uri: str ) -> List[Dict[str, Any]]:
-    module_system_prompt = """You are a senior Amazon A+ Content designer.
+def _build_module_llm_instruction(title: str, bullets: str, has_logo: bool = True) -> str:
+    inputs_block = (
+        f"\n\nInputs for context:\n"
+        f"Product Title:\n{title}\n\n"
+        f"Bullet Points:{bullets}\n"
+        f"\nAssets:\n- Product image (attached)\n"
+    )
+    if has_logo:
+        inputs_block += "- Brand logo (attached)\n"
+    return _MODULE_USER_PROMPT + inputs_block + _MODULE_OUTPUTS_BLOCK
+
+_MODULE_SYSTEM_PROMPT = """You are a senior Amazon A+ Content designer.
 You must output EXACTLY five modules in JSON.
 
 Rules:
@@ -148,17 +140,18 @@ Rules:
 - Do NOT include any text outside the five modules. No preamble or epilogue.
 """
 
-    module_instruction = _build_module_llm_instruction(title, bullets)
+def _get_module_llm_prompt(title: str, bullets: str, product_file_id: str, logo_file_id: Optional[str]) -> List[Dict[str, Any]]:
+    module_instruction = _build_module_llm_instruction(title, bullets, has_logo=bool(logo_file_id))
     user_content_parts = [
-        {"type": "text", "text": module_instruction},
-        {"type": "image_url", "image_url": {"url": product_uri}},
+        {"type": "input_text", "text": module_instruction},
+        {"type": "input_image", "file_id": product_file_id},
     ]
 
-    if logo_uri:
-        user_content_parts.append({"type": "image_url", "image_url": {"url":logo_uri}})
+    if logo_file_id:
+        user_content_parts.append({"type": "input_image", "file_id": logo_file_id})
 
     return [
-        {"role": "system", "content": module_system_prompt},
+        {"role": "system", "content": _MODULE_SYSTEM_PROMPT},
         {
             "role": "user",
             "content": user_content_parts
@@ -173,18 +166,17 @@ def stringify_module(obj: dict) -> str:
         f'Subtext:\n{obj["subtext"]}'
     )
 
-def _build_image_prompt(module_instruction: str) -> str:
-    image_system_message = (
-        "Create a 970:600 px full module (strictly follow this size for the generated module, "
-        "don’t generate other sizes) for the product following the instructions below.\n"
-        "Make sure to read the instructions carefully and include all required text without missing any details.\n"
-        "Don’t change the look of the submitted logo if included."
-    )
-
-    return f"""{image_system_message}
+_IMG_SYSTEM_MESSAGE = (
+    "Create a 970:600 px full module (strictly follow this size for the generated module, "
+    "don’t generate other sizes) for the product following the instructions below.\n"
+    "Make sure to read the instructions carefully and include all required text without missing any details.\n"
+    "Don’t change the look of the submitted logo if included."
+)
+_IMG_PREFIX = _IMG_SYSTEM_MESSAGE + """
 
 Instructions:
-{module_instruction}
+"""
+_IMG_SUFFIX = """
 
 Placement guidelines:
 - Include both the provided PRODUCT and LOGO in the final image.
@@ -193,53 +185,162 @@ Placement guidelines:
 - Maintain a cohesive, premium, Montessori-inspired tone and color harmony.
 """
 
+def _build_image_prompt(module_instruction: str) -> str:
+    return f"{_IMG_PREFIX}{module_instruction}{_IMG_SUFFIX}"
+
 # Target Amazon A+ spec
 TARGET_W, TARGET_H = 970, 600
 # Closest valid OpenAI generation size
 GEN_W, GEN_H = 1536, 1024
 
-def make_blank_canvas_png(w: int, h: int) -> bytes:
-    """Create transparent PNG canvas for edit API."""
-    img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
 
-def save_b64_to_file(b64: str, path: str):
-    data = base64.b64decode(b64)
-    with open(path, "wb") as f:
-        f.write(data)
+def make_blank_canvas_png(w: int, h: int) -> bytes:
+    """Create transparent PNG canvas for edit API.
+
+    The PNG is assembled by hand (8-bit RGBA, one IDAT) instead of going through
+    a PIL image, so no w*h*4 pixel buffer is allocated. Each scanline is a zero
+    filter byte followed by zeroed pixels, which zlib level 9 shrinks to ~6 KB
+    for 1536x1024 -- this canvas is uploaded with every edit call.
+    """
+    ihdr = struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+    compressor = zlib.compressobj(9)
+    row = bytes(1 + w * 4)
+    idat = b"".join(compressor.compress(row) for _ in range(h)) + compressor.flush()
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", idat)
+        + _png_chunk(b"IEND", b"")
+    )
 
-def generate_image(client: OpenAI, product_image_path: str, logo_image_path: str, instruction: str, idx: int, outdir: str):
-    base_canvas = make_blank_canvas_png(GEN_W, GEN_H)
+@functools.lru_cache(maxsize=1)
+def _blank_canvas() -> bytes:
+    # The canvas never changes, so encode it once per process -- on first use,
+    # so --help and argument errors don't pay for it
+    return make_blank_canvas_png(GEN_W, GEN_H)
+
+async def generate_image(client: AsyncOpenAI,
+                         product_bytes: bytes,
+                         logo_bytes: Optional[bytes],
+                         product_name: str,
+                         logo_name: Optional[str],
+                         instruction: str,
+                         idx: int,
+                         outdir: str,
+                         resample: Image.Resampling = Image.Resampling.LANCZOS):
+    images = [("canvas.png", _blank_canvas()), (product_name, product_bytes)]
+    if logo_bytes is not None:
+        images.append((logo_name, logo_bytes))
 
     # 4️⃣ Generate using supported size 1536x1024
     print(f"🎨 Generating base image (1536x1024) for {idx}...")
-    result = client.images.edit(
+    result = await acall_with_backoff(
+        openai_transient,
+        client.images.edit,
         model="gpt-image-1",
         prompt=_build_image_prompt(instruction),
         size=f"{GEN_W}x{GEN_H}",
-        image=[
-            ("canvas.png", base_canvas),
-            (os.path.basename(product_image_path), open(product_image_path, "rb").read()),
-            (os.path.basename(logo_image_path), open(logo_image_path, "rb").read()),
-        ],
+        image=images,
     )
 
-    # 5️⃣ Save and downscale to 970x600
-    b64 = result.data[0].b64_json
-    tmp_path = Path(outdir) / f"_tmp_generated_{idx}.png"
-    save_b64_to_file(b64, tmp_path)
+    # Decode/resize/save is CPU-bound; a worker thread keeps the event loop free to
+    # receive the other edits meanwhile
+    await asyncio.to_thread(_save_module_image, result.data[0].b64_json, idx, outdir, resample)
+
+# Seconds between status checks of a submitted batch (batches finish within 24h)
+BATCH_POLL_SECONDS = 30
+
+async def generate_images_batch(client: AsyncOpenAI,
+                                image_file_ids: List[str],
+                                instructions: Dict[int, str],
+                                outdir: str,
+                                resample: Image.Resampling = Image.Resampling.LANCZOS) -> List[Tuple[int, str]]:
+    """Run every module edit as one Batch API job (half price, up to 24h turnaround).
+
+    image_file_ids are Files API ids of the canvas, product and (optional) logo, in
+    that order; referencing them keeps the JSONL from carrying a base64 copy of each
+    image per line. instructions maps each module's idx to its text. Returns
+    (idx, error) for each module whose edit failed.
+    """
+    images = [{"file_id": file_id} for file_id in image_file_ids]
+    lines = []
+    for idx, instruction in instructions.items():
+        lines.append(json.dumps({
+            "custom_id": f"image_{idx}",
+            "method": "POST",
+            "url": "/v1/images/edits",
+            "body": {
+                "model": "gpt-image-1",
+                "prompt": _build_image_prompt(instruction),
+                "size": f"{GEN_W}x{GEN_H}",
+                "images": images,
+            },
+        }))
+
+    batch_file = await acall_with_backoff(
+        openai_transient,
+        client.files.create,
+        file=("image_edits.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    # The JSONL input and the result files (the output holds every full-size PNG)
+    # are deleted once the results are read
+    batch_file_ids = [batch_file.id]
+    try:
+        batch = await acall_with_backoff(
+            openai_transient,
+            client.batches.create,
+            input_file_id=batch_file.id,
+            endpoint="/v1/images/edits",
+            completion_window="24h",
+        )
+        print(f"📦 Submitted batch {batch.id} with {len(lines)} image edits, checking every {BATCH_POLL_SECONDS}s...")
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await acall_with_backoff(openai_transient, client.batches.retrieve, batch.id)
+        result_file_ids = [file_id for file_id in (batch.output_file_id, batch.error_file_id) if file_id]
+        batch_file_ids.extend(result_file_ids)
+        if batch.status != "completed":
+            raise click.ClickException(f"Batch {batch.id} ended with status {batch.status}")
+
+        failed = []
+        saves = []
+        pending = set(instructions)
+        # Requests that errored before reaching the endpoint only appear in the error file
+        for file_id in result_file_ids:
+            output = await acall_with_backoff(openai_transient, client.files.content, file_id)
+            for line in output.text.splitlines():
+                item = json.loads(line)
+                idx = int(item["custom_id"].rsplit("_", 1)[1])
+                response = item.get("response") or {}
+                if response.get("status_code") != 200:
+                    failed.append((idx, str(item.get("error") or response.get("body"))))
+                else:
+                    b64 = response["body"]["data"][0]["b64_json"]
+                    saves.append(asyncio.to_thread(_save_module_image, b64, idx, outdir, resample))
+                pending.discard(idx)
+        # All results are already here, so post-process them in parallel on worker threads
+        await asyncio.gather(*saves)
+    finally:
+        await _delete_files(client, batch_file_ids)
+    failed.extend((idx, "no result in batch output") for idx in sorted(pending))
+    return failed
+
+def _save_module_image(b64: str, idx: int, outdir: str, resample: Image.Resampling) -> None:
+    # 5️⃣ Decode and downscale to 970x600 in memory (no temp file round-trip)
+    # The API output is trusted base64, so skip validation and use the SIMD decoder
+    raw = pybase64.b64decode(b64, validate=False)
 
     out_image_path = Path(outdir) / f"image_{idx}.png"
-    with Image.open(tmp_path) as img:
-        final = img.resize((TARGET_W, TARGET_H), Image.LANCZOS)
-        final.save(out_image_path)
+    with Image.open(io.BytesIO(raw)) as img:
+        # gpt-image-1 has no size closer to 970x600 than 1536x1024, so a resample is unavoidable
+        final = img.resize((TARGET_W, TARGET_H), resample)
+        final.save(out_image_path, format="PNG", compress_level=1, optimize=False)
 
     print(f"✅ Saved final image: {out_image_path} (970x600)")
 
-    tmp_path.unlink()
-
 @click.command()
 @click.option("--product-image", "product_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=True, help="Path to the main product image.")
 @click.option("--logo-image", "logo_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to the brand logo image (optional but recommended).")
@@ -247,12 +348,20 @@ def generate_image(client: OpenAI, product_image_path: str, logo_image_path: str
 @click.option("--title-path", "title_path", type=click.Path(exists=True), required=False, help="Path to a file containing the title")
 @click.option("--model", required=False, default="gpt-4o-mini", show_default=True, help="OpenAI model with vision support.")
 @click.option("--outdir", type=click.Path(file_okay=False, path_type=Path), default=Path("."), show_default=True, help="Directory to write bullets.json and bullets.txt")
+@click.option("--llm-cache", "llm_cache", is_flag=True, default=False, help="Reuse cached bullets/modules LLM responses for identical title, images and model (7-day expiry).")
+@click.option("--fast-resize", "fast_resize", is_flag=True, default=False, help=assets.FAST_RESIZE_HELP)
+@click.option("--batch", "batch", is_flag=True, default=False, help="Submit the image edits through the Batch API (half price, results within 24h) and wait for them.")
+@click.option("--no-cache", "no_cache", is_flag=True, default=False, help="Always call the image edit API, even if identical inputs were generated before.")
 def main(product_image: Path,
          logo_image: Optional[Path],
          title: str,
          title_path: str,
          model: str,
-         outdir: Path):
+         outdir: Path,
+         llm_cache: bool,
+         fast_resize: bool,
+         batch: bool,
+         no_cache: bool):
 
     if not title and not title_path:
         raise click.UsageError("You must provide either --title or --title-path")
@@ -262,105 +371,248 @@ def main(product_image: Path,
             title = f.read().strip()
 
     click.echo(f"Title: {title}")
+    asyncio.run(amain(product_image, logo_image, title, model, outdir, llm_cache, fast_resize, batch, not no_cache))
+
+async def _none() -> None:
+    return None
+
+async def _upload_vision_file(client: AsyncOpenAI, name: str, data: bytes) -> str:
+    uploaded = await acall_with_backoff(openai_transient, client.files.create, file=(name, data), purpose="vision")
+    return uploaded.id
+
+async def _delete_files(client: AsyncOpenAI, file_ids: List[str]) -> None:
+    # Best effort: a failed delete must not mask the run's own outcome
+    await asyncio.gather(*(client.files.delete(file_id) for file_id in file_ids), return_exceptions=True)
+
+async def _delete_uploads(client: AsyncOpenAI, uploads: List["asyncio.Task[str]"]) -> None:
+    # Likewise, a failed upload leaves nothing to delete
+    file_ids = await asyncio.gather(*uploads, return_exceptions=True)
+    await _delete_files(client, [file_id for file_id in file_ids if isinstance(file_id, str)])
+
+async def _cached_llm_call(use_cache: bool, key: str, fetch: Callable[[], Awaitable[Tuple[str, Dict[str, Any]]]]) -> Tuple[str, Dict[str, Any]]:
+    """Return (text, usage) from fetch(), served from the LLM response cache when enabled."""
+    if use_cache:
+        cached = cache.get_json(key)
+        if cached is not None:
+            return cached["text"], cached["usage"]
+    text, usage = await fetch()
+    if use_cache:
+        cache.set_json(key, {"text": text, "usage": usage})
+    return text, usage
+
+async def amain(product_image: Path,
+                logo_image: Optional[Path],
+                title: str,
+                model: str,
+                outdir: Path,
+                llm_cache: bool = False,
+                fast_resize: bool = False,
+                batch: bool = False,
+                use_cache: bool = True):
     start = time.time()
-    outdir.mkdir(parents=True, exist_ok=True)
-
-    product_uri = _encode_to_data_uri(product_image)
-    logo_uri = _encode_to_data_uri(logo_image) if logo_image else None
-
-    client = OpenAI()
-
-    print("Generating the bullets")
-    bullets_llm_prompt = _get_bullet_llm_prompt(title, product_uri, logo_uri)
-    resp = client.responses.create(
-        model=model,
-        input=bullets_llm_prompt,
+    # Client construction (TLS context setup), the output dir and the disk read of each
+    # image are independent, so they run together on worker threads. The raw image
+    # bytes are read here once and shared by the uploads and every edit call below.
+    client, product_bytes, logo_bytes, _ = await asyncio.gather(
+        asyncio.to_thread(clients.get_async_client),
+        asyncio.to_thread(product_image.read_bytes),
+        asyncio.to_thread(logo_image.read_bytes) if logo_image else _none(),
+        asyncio.to_thread(outdir.mkdir, parents=True, exist_ok=True),
     )
 
-    print("Tokens for bullets:", json.dumps(resp.usage.model_dump(), indent=2))
-
-    raw_text = resp.output_text
+    # The bullets and modules requests reference the images by Files API id instead
+    # of each re-sending them as base64. Uploads start on first use (so a fully
+    # cached --llm-cache run uploads nothing) and are deleted when the run ends.
+    uploads: List["asyncio.Task[str]"] = []  # every upload of the run, for cleanup
+    image_uploads: List["asyncio.Task[str]"] = []  # product, then the optional logo
+
+    async def _file_ids() -> Tuple[str, Optional[str]]:
+        if not image_uploads:
+            image_uploads.append(asyncio.create_task(_upload_vision_file(client, product_image.name, product_bytes)))
+            if logo_image:
+                image_uploads.append(asyncio.create_task(_upload_vision_file(client, logo_image.name, logo_bytes)))
+            uploads.extend(image_uploads)
+        file_ids = await asyncio.gather(*image_uploads)
+        return file_ids[0], file_ids[1] if len(file_ids) > 1 else None
+
+    # One client (and one HTTP/2 connection pool) shared by every request in the run;
+    # it is closed once the run is done
     try:
-        bullets_data = _get_llm_json_response(raw_text)
-    except Exception:
-        bullets_data = {"bullets": []}
-
-    bullets = bullets_data.get("bullets", [])
-    def _blank_item():
-        return {
-            "heading": "Encourages Active, Independent Play",
-            "customer_benefit": "Helps children build balance, confidence, and coordination through natural movement and exploration.",
-            "key_feature": "Montessori-inspired 3-in-1 climbing set includes a foldable triangle, reversible ramp, and arch for endless play configurations.",
-            "proof_or_differentiator": "Designed to support gross motor skill development while keeping kids active and engaged indoors — no screens required."
-        }
-
-    while len(bullets) < 3:
-        bullets.append(_blank_item())
-    bullets = bullets[:3]
-
-    # Build TXT output (multi-line, same as before)
-    lines = []
-    flat_bullets = []  # for flat JSON format
-    for idx, item in enumerate(bullets, start=1):
-        text_block = (
-            f"{item.get('heading','').strip()}\n\n"
-            f"Customer Benefit: {item.get('customer_benefit','').strip()}\n"
-            f"Key Feature: {item.get('key_feature','').strip()}\n"
-            f"Proof / Differentiator: {item.get('proof_or_differentiator','').strip()}"
+        # File ids change every run, so cache keys build the same prompts with the
+        # images' content digests in their place (the image cache keys on them too)
+        image_refs: Tuple[Optional[str], Optional[str]] = (None, None)
+        if llm_cache or use_cache:
+            image_refs = (
+                await asyncio.to_thread(cache.file_digest, product_image),
+                await asyncio.to_thread(cache.file_digest, logo_image) if logo_image else None,
+            )
+
+        print("Generating the bullets")
+
+        async def _fetch_bullets():
+            resp = await acall_with_backoff(
+                openai_transient,
+                client.responses.create,
+                model=model,
+                input=_get_bullet_llm_prompt(title, *await _file_ids()),
+            )
+            return resp.output_text, resp.usage.model_dump()
+
+        bullets_key = cache.cache_key("responses", model, json.dumps(_get_bullet_llm_prompt(title, *image_refs), sort_keys=True))
+        raw_text, bullets_usage = await _cached_llm_call(llm_cache, bullets_key, _fetch_bullets)
+
+        print("Tokens for bullets:", json.dumps(bullets_usage, indent=2))
+
+        try:
+            bullets_data = llm_json.extract_json(raw_text)
+        except Exception:
+            bullets_data = {"bullets": []}
+
+        bullets = bullets_data.get("bullets", [])
+        def _blank_item():
+            return {
+                "heading": "Encourages Active, Independent Play",
+                "customer_benefit": "Helps children build balance, confidence, and coordination through natural movement and exploration.",
+                "key_feature": "Montessori-inspired 3-in-1 climbing set includes a foldable triangle, reversible ramp, and arch for endless play configurations.",
+                "proof_or_differentiator": "Designed to support gross motor skill development while keeping kids active and engaged indoors — no screens required."
+            }
+
+        while len(bullets) < 3:
+            bullets.append(_blank_item())
+        bullets = bullets[:3]
+
+        # Build TXT output (multi-line, same as before)
+        txt_blocks = []
+        flat_bullets = []  # for flat JSON format
+        for idx, item in enumerate(bullets, start=1):
+            heading = item.get('heading', '').strip()
+            details = (
+                f"Customer Benefit: {item.get('customer_benefit','').strip()}\n"
+                f"Key Feature: {item.get('key_feature','').strip()}\n"
+                f"Proof / Differentiator: {item.get('proof_or_differentiator','').strip()}"
+            )
+            flat_bullets.append(f"{heading}\n\n{details}")
+            # For txt file with numbering
+            txt_blocks.append(f"{idx}. {heading}\n{details}")
+
+        txt_path = outdir / "bullets.txt"
+        bullets_txt = "\n\n".join(txt_blocks)
+        json_path = outdir / "bullets.json"
+        # Write the bullet files on worker threads while the modules request is in flight
+        bullets_written = asyncio.gather(
+            asyncio.to_thread(txt_path.write_text, bullets_txt, encoding="utf-8"),
+            asyncio.to_thread(
+                json_path.write_text,
+                json.dumps({"bullets": flat_bullets}, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            ),
         )
-        flat_bullets.append(text_block)
-
-        # For txt file with numbering
-        lines.append(f"{idx}. {item.get('heading','').strip()}")
-        lines.append(f"Customer Benefit: {item.get('customer_benefit','').strip()}")
-        lines.append(f"Key Feature: {item.get('key_feature','').strip()}")
-        lines.append(f"Proof / Differentiator: {item.get('proof_or_differentiator','').strip()}")
-        if idx < len(bullets):
-            lines.append("")
-
-    txt_path = outdir / "bullets.txt"
-    bullets_txt = "\n".join(lines)
-    txt_path.write_text(bullets_txt, encoding="utf-8")
-
-    json_path = outdir / "bullets.json"
-    json_path.write_text(json.dumps({"bullets": flat_bullets}, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    print(f"\nBullets Saved:\n- {json_path}\n- {txt_path}")
-
-    print("generating module......")
-    module_llm_prompt=_get_module_llm_prompt(title, bullets_txt, product_uri, logo_uri)
-    module_completion = client.chat.completions.create(
-        model=model,
-        messages=module_llm_prompt,
-        temperature=1,
-    )
-
-    print("Tokens for modules:", json.dumps(module_completion.usage.model_dump(), indent=2))
-
-    module_content = (module_completion.choices[0].message.content or "").strip()
-    try:
-        modules_data = _get_llm_json_response(module_content)
-    except Exception:
-        modules_data = {"modules": []}
 
-    modules = modules_data.get("modules", [])
-
-    text_modules = []
-    for module in modules:
-        formatted = stringify_module(module)
-        text_modules.append(formatted)
-
-    module_txt_path = outdir / "modules.txt"
-
-    with open(module_txt_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(text_modules) + "\n")
-
-    click.echo(f"✅ Modules written to {module_txt_path}")
-
-    print("Generating image")
-    for current_idx, current_text_module in enumerate(text_modules):
-        generate_image(client, product_image, logo_image, current_text_module, current_idx, outdir)
+        print("generating module......")
+
+        async def _fetch_modules():
+            # Responses API rather than chat completions: only its image inputs accept a file id
+            module_resp = await acall_with_backoff(
+                openai_transient,
+                client.responses.create,
+                model=model,
+                input=_get_module_llm_prompt(title, bullets_txt, *await _file_ids()),
+                temperature=1,
+            )
+            return module_resp.output_text, module_resp.usage.model_dump()
+
+        modules_key = cache.cache_key("responses", model, "1", json.dumps(_get_module_llm_prompt(title, bullets_txt, *image_refs), sort_keys=True))
+        try:
+            module_content, modules_usage = await _cached_llm_call(llm_cache, modules_key, _fetch_modules)
+        finally:
+            await bullets_written
+        print(f"\nBullets Saved:\n- {json_path}\n- {txt_path}")
+
+        print("Tokens for modules:", json.dumps(modules_usage, indent=2))
+
+        module_content = module_content.strip()
+        try:
+            modules_data = llm_json.extract_json(module_content)
+        except Exception:
+            modules_data = {"modules": []}
+
+        modules = modules_data.get("modules", [])
+
+        text_modules = []
+        for module in modules:
+            formatted = stringify_module(module)
+            text_modules.append(formatted)
+
+        module_txt_path = outdir / "modules.txt"
+        # Likewise, modules.txt is written while the image edits run
+        modules_written = asyncio.create_task(
+            asyncio.to_thread(module_txt_path.write_text, "\n".join(text_modules) + "\n", encoding="utf-8")
+        )
 
+        print("Generating image")
+        resample = assets.resample_filter(fast_resize)
+        # Each module image is cached under its prompt, the input digests and its
+        # idx (the cached file is image_{idx}.png); hits skip the edit entirely
+        product_digest, logo_digest = image_refs
+        image_keys = {
+            idx: cache.cache_key("images.edit", "gpt-image-1", f"{GEN_W}x{GEN_H}", _build_image_prompt(text_module),
+                                 product_digest or "", logo_digest or "", resample.name, str(idx))
+            for idx, text_module in enumerate(text_modules)
+        }
+        pending_modules = dict(enumerate(text_modules))
+        if use_cache:
+            for idx in list(pending_modules):
+                if await asyncio.to_thread(cache.restore, image_keys[idx], outdir):
+                    print(f"♻️ Reused cached image for identical inputs: {outdir / f'image_{idx}.png'}")
+                    del pending_modules[idx]
+        if not pending_modules:
+            failed = []
+        elif batch:
+            # Batch bodies are JSON, so the edit inputs are referenced by file id: the
+            # product/logo uploads above plus the canvas (deleted with them at the end)
+            canvas_upload = asyncio.create_task(_upload_vision_file(client, "canvas.png", _blank_canvas()))
+            uploads.append(canvas_upload)
+            product_file_id, logo_file_id = await _file_ids()
+            image_file_ids = [await canvas_upload, product_file_id] + ([logo_file_id] if logo_file_id else [])
+            failed = await generate_images_batch(client, image_file_ids, pending_modules, outdir, resample)
+        else:
+            # The edits are independent and I/O-bound, so run them all at once
+            results = await asyncio.gather(
+                *(
+                    generate_image(
+                        client,
+                        product_bytes,
+                        logo_bytes,
+                        product_image.name,
+                        logo_image.name if logo_image else None,
+                        current_text_module,
+                        current_idx,
+                        outdir,
+                        resample,
+                    )
+                    for current_idx, current_text_module in pending_modules.items()
+                ),
+                return_exceptions=True,
+            )
+            failed = [(idx, f"{type(exc).__name__}: {exc}") for idx, exc in zip(pending_modules, results) if isinstance(exc, BaseException)]
+        if use_cache:
+            failed_idx = {idx for idx, _ in failed}
+            await asyncio.gather(*(
+                asyncio.to_thread(cache.store, image_keys[idx], [outdir / f"image_{idx}.png"])
+                for idx in pending_modules if idx not in failed_idx
+            ))
+        await modules_written
+        click.echo(f"✅ Modules written to {module_txt_path}")
+        if failed:
+            raise click.ClickException(
+                "; ".join(f"image {idx} failed: {error}" for idx, error in failed)
+            )
+    finally:
+        await _delete_uploads(client, uploads)
+        await clients.close_async_client()
+
+    if llm_cache:
+        print(f"LLM cache: {cache.llm_stats['hits']} hit(s), {cache.llm_stats['misses']} miss(es)")
     end = time.time()
     print(f"Runtime: {end - start:.4f} seconds")
 
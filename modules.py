@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, json, base64, mimetypes
-from typing import List
+import os, json, asyncio, mimetypes
+from typing import Any, Dict, List
 import click
-from openai import OpenAI
+
+import assets
+import clients
+from api_retry import acall_with_backoff, openai_transient
 
 # ========= Fixed Output Requirements =========
 # We enforce the exact, plain-text module template (no JSON, no markdown).
@@ -59,9 +62,7 @@ def img_to_data_url(path: str) -> str:
     mime, _ = mimetypes.guess_type(path)
     if not mime or not mime.startswith("image/"):
         raise click.UsageError(f"Not an image file: {path}")
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+    return assets.image_data_uri(path)
 
 def load_bullets(json_path: str) -> List[str]:
     if not os.path.isfile(json_path):
@@ -78,6 +79,20 @@ def load_bullets(json_path: str) -> List[str]:
         raise click.UsageError("'bullets' must be a list of non-empty strings.")
     return bullets
 
+async def create_completion(model: str, messages: List[Dict[str, Any]]):
+    # Uses the process-wide async client shared with main.py, closed once the call is done
+    client = clients.get_async_client()
+    try:
+        return await acall_with_backoff(
+            openai_transient,
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
+            temperature=1,
+        )
+    finally:
+        await clients.close_async_client()
+
 # ========= CLI =========
 
 @click.command()
@@ -106,10 +121,9 @@ def main(product_image, logo_image, title, description, bullets_json, model, out
 
     user_prompt = FIXED_USER_PROMPT + CONSTRAINTS_BRIDGE + inputs_block
 
-    client = OpenAI()
-    completion = client.chat.completions.create(
-        model=model,
-        messages=[
+    completion = asyncio.run(create_completion(
+        model,
+        [
             {"role": "system", "content": SYSTEM_PROMPT},
             {
                 "role": "user",
@@ -120,8 +134,7 @@ def main(product_image, logo_image, title, description, bullets_json, model, out
                 ],
             },
         ],
-        temperature=1,
-    )
+    ))
 
     content = (completion.choices[0].message.content or "").strip()
 
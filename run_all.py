@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Generate bullets (bullets.py), the Gemini module image (banana.py) and the
+typography-first module image (image.py) for one product in a single run.
+
+The three jobs talk to independent providers/endpoints, so they are started
+together with asyncio.gather: total wall-clock is roughly the slowest call
+rather than the sum of all three. In-flight API calls are still bounded by
+api_retry's MAX_CONCURRENT slots.
+
+Outputs:
+- <outdir>/bullets/ : bullets.txt, bullets.json
+- <outdir>/banana/  : Gemini module image(s)
+- <outdir>/image/   : prompt.txt, raw and final typography module images
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Optional
+
+import click
+
+import assets
+import banana
+import bullets
+import image
+
+
+async def run_all(product_image: Path,
+                  logo_image: Path,
+                  title: str,
+                  instruction_path: Path,
+                  outdir: Path,
+                  model: str,
+                  use_cache: bool,
+                  fast_resize: bool,
+                  output_format: str):
+    jobs = {
+        "bullets": bullets.agenerate_bullets(
+            title,
+            outdir / "bullets",
+            product_image=product_image,
+            logo_image=logo_image,
+            model=model,
+        ),
+        "banana": banana.agenerate_image(
+            str(product_image),
+            str(logo_image),
+            str(instruction_path),
+            str(outdir / "banana"),
+            "1536x1024",
+            use_cache=use_cache,
+            fast_resize=fast_resize,
+            output_format=output_format,
+        ),
+        "image": image.agenerate_module_image(
+            str(instruction_path),
+            result_dir=str(outdir / "image"),
+            use_cache=use_cache,
+            fast_resize=fast_resize,
+            output_format=output_format,
+        ),
+    }
+    # Let every job finish even if one fails, then report all failures together
+    results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    return dict(zip(jobs, results))
+
+
+@click.command()
+@click.option("--product-image", "product_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=True, help="Path to the main product image.")
+@click.option("--logo-image", "logo_image", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=True, help="Path to the brand logo image.")
+@click.option("--title", required=False, help="Product title as shown on Amazon.")
+@click.option("--title-path", "title_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=False, help="Path to a file containing the title")
+@click.option("--instruction-path", "instruction_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), required=True, help="Path to text file containing the module generation instructions.")
+@click.option("--model", required=False, default=bullets.DEFAULT_MODEL, show_default=True, help="OpenAI model with vision support (bullets).")
+@click.option("--outdir", type=click.Path(file_okay=False, path_type=Path), default=Path("./outputs"), show_default=True, help="Root directory; each tool writes into its own subfolder.")
+@click.option("--no-cache", "no_cache", is_flag=True, default=False, help="Always call the image APIs, even if identical inputs were generated before.")
+@click.option("--fast-resize", "fast_resize", is_flag=True, default=False, help=assets.FAST_RESIZE_HELP)
+@click.option("--output-format", "output_format", type=click.Choice(["png", "jpg"]), default="png", show_default=True, help="File format of the final 970x600 images.")
+def main(product_image: Path,
+         logo_image: Path,
+         title: Optional[str],
+         title_path: Optional[Path],
+         instruction_path: Path,
+         model: str,
+         outdir: Path,
+         no_cache: bool,
+         fast_resize: bool,
+         output_format: str):
+    if not title and not title_path:
+        raise click.UsageError("You must provide either --title or --title-path")
+    if not title:
+        title = title_path.read_text(encoding="utf-8").strip()
+
+    start = time.time()
+    results = asyncio.run(run_all(
+        product_image,
+        logo_image,
+        title,
+        instruction_path,
+        outdir,
+        model,
+        use_cache=not no_cache,
+        fast_resize=fast_resize,
+        output_format=output_format,
+    ))
+    end = time.time()
+    print(f"Runtime: {end - start:.4f} seconds")
+
+    failed = {name: exc for name, exc in results.items() if isinstance(exc, BaseException)}
+    if failed:
+        raise click.ClickException(
+            "; ".join(f"{name} failed: {type(exc).__name__}: {exc}" for name, exc in failed.items())
+        )
+
+
+# python run_all.py --product-image="./example/product.jpg" --logo-image="./example/logo.jpg" --title-path="./example/title.txt" --instruction-path="./example/instruction.txt"
+if __name__ == "__main__":
+    main()